@@ -10,8 +10,11 @@
 
 #------------------------------------------------------------------ IMPORTS ---
 # Built-in
+import gzip
+import json
 import os.path
 import traceback
+from collections import OrderedDict
 
 # Third Party
 import maya.OpenMayaUI as OpenMayaUI
@@ -27,20 +30,130 @@ import curve_utils
 global CURVE_TOOL_UI
 global CURVE_FILE_FORMAT
 CURVE_FILE_EXT = ".crv"
+SNAPSHOT_FILE_EXT = ".crvs"
+SNAPSHOT_VERSION = 1
+
+# string attribute holding the name of the shape a control was built from
+SHAPE_ATTR = "curveToolShape"
+
+CURVE_TOOL_UI = None
+
+# {shapes_dir: (dir mtime, [shape names])}
+SHAPES_CACHE = {}
+# {shape_file: (file mtime, [MEL cmds])}
+MEL_CMDS_CACHE = {}
+# {shape_file: (file mtime, fingerprint)}
+FINGERPRINTS_CACHE = {}
 
 #------------------------------------------------------------------ CLASSES ---
 class CurveToolUI(object):
     win_name = "CurveToolUI"
     win_title = "Curve Tools UI v0.1"
     
-    def __init__(self):
+    def __init__(self, session=False):
+        '''
+        If 'session' is True, closing the window only hides it. The preview
+        rig, the modelPanel and the shapes list are kept alive so that show()
+        can restore the window without touching the scene.
+        '''
         self.preview_curve = None
+        self.session = session
+        self.closed = False
+        self.__shapes_stamp = None
         
         self.__preCreateUI()
         self.__createUI()
         self.__postCreateUI()
     
+    def show(self):
+        '''
+        Restore the window from the retained session state. Return False if the
+        session can no longer be restored (the window or the preview rig were
+        deleted, ie. by a new scene) and the UI must be recreated.
+        '''
+        result = False
+        
+        if self.__sessionIsValid():
+            if get_shapesStamp() != self.__shapes_stamp:
+                self.__refreshShapesList()
+                
+            cmds.showWindow(self.win)
+            result = True
+        
+        return result
+    
+    def close(self):
+        '''Delete the window and tear down the preview rig.'''
+        if self.closed:
+            return
+        
+        if cmds.window(self.win, exists=True):
+            cmds.deleteUI(self.win)
+        else:
+            self.__handleUIClosed()
+    
+    def __sessionIsValid(self):
+        result = False
+        
+        if self.session and cmds.window(self.win, exists=True):
+            # track the rig by MObject, a reopened file may hold nodes with
+            # the same names
+            if self.__grp_handle.isAlive() and self.__cam_handle.isAlive():
+                result = cmds.panel(self.viewport, exists=True)
+                
+        return result
+    
+    def get_rigRoot(self):
+        '''
+        Return the full path of the preview rig, or None if it no longer 
+        exists.
+        '''
+        result = None
+        
+        if not self.closed and self.__grp_handle.isAlive():
+            grp = self.__grp_handle.object()
+            result = OpenMaya.MFnDagNode(grp).fullPathName()
+            
+        return result
+    
+    def __getMObject(self, node):
+        sel = OpenMaya.MSelectionList()
+        sel.add(node)
+        
+        result = OpenMaya.MObject()
+        sel.getDependNode(0, result)
+        
+        return result
+    
+    def __handleBeforeSave(self, *args):
+        self.__setRigDoNotWrite()
+    
+    def __setRigDoNotWrite(self):
+        # the rig, the camera and the preview curve must never end up in the
+        # user's file
+        grp = self.get_rigRoot()
+        
+        if grp is None:
+            return
+        
+        nodes = [grp] + (cmds.listRelatives(grp, ad=True, fullPath=True) or [])
+        
+        for node in nodes:
+            OpenMaya.MFnDependencyNode(self.__getMObject(node)).setDoNotWrite(True)
+    
+    def __handleSceneChange(self, *args):
+        self.close()
+    
     def __preCreateUI(self):
+        undo_state = cmds.undoInfo(q=True, state=True)
+        cmds.undoInfo(stateWithoutFlush=False)
+        
+        try:
+            self.__createPreviewRig()
+        finally:
+            cmds.undoInfo(stateWithoutFlush=undo_state)
+    
+    def __createPreviewRig(self):
         self.grp = cmds.createNode('transform', name="CURVE_TOOLS_NULL", ss=True)
         self.ns = 'curve_tools'
         
@@ -59,7 +172,14 @@ class CurveToolUI(object):
             wci=[0,0,0]
         )[0]
         
-        cmds.parent(self.viewport_cam, self.grp)
+        self.viewport_cam = cmds.parent(self.viewport_cam, self.grp)[0]
+        
+        self.__grp_handle = OpenMaya.MObjectHandle(self.__getMObject(self.grp))
+        self.__cam_handle = OpenMaya.MObjectHandle(
+            self.__getMObject(self.viewport_cam)
+        )
+        
+        self.__setRigDoNotWrite()
                 
         if tmp:
             cmds.select(tmp)
@@ -76,10 +196,11 @@ class CurveToolUI(object):
             cmds.deleteUI(self.win)
             
         self.win = cmds.window(self.win, t=CurveToolUI.win_title, 
-                               mb=True, w=656, h=385)
+                               mb=True, w=656, h=385, retain=self.session)
         
         self.main_menu = cmds.menu(label="Menu", parent=self.win)
         #cmds.menuItem(label="Refresh List", c=self.handleRefreshMenu)
+        cmds.menuItem(label="Sync Library From Scene", c=self.__handleSyncMenu)
         
         self.help_menu = cmds.menu(label="Help", parent=self.win)
         #cmds.menuItem(label="Help", c=self.handleHelpMenu)
@@ -123,31 +244,74 @@ class CurveToolUI(object):
             self.__handleUIClosed
         )
         
+        #-------------------------------------------- setup scene callbacks ---
+        self.__sceneCallbacks = [
+            OpenMaya.MSceneMessage.addCallback(
+                OpenMaya.MSceneMessage.kBeforeSave, 
+                self.__handleBeforeSave
+            ),
+            OpenMaya.MSceneMessage.addCallback(
+                OpenMaya.MSceneMessage.kBeforeExport, 
+                self.__handleBeforeSave
+            ),
+            OpenMaya.MSceneMessage.addCallback(
+                OpenMaya.MSceneMessage.kBeforeNew, 
+                self.__handleSceneChange
+            ),
+            OpenMaya.MSceneMessage.addCallback(
+                OpenMaya.MSceneMessage.kBeforeOpen, 
+                self.__handleSceneChange
+            )
+        ]
+        
         cmds.showWindow(self.win)
     
     def __postCreateUI(self):
         cmds.modelPanel(self.viewport, edit=True, cam=self.viewport_cam)
         cmds.modelEditor(self.viewport, edit=True, grid=False)
 
-        self.__isolateSelectedInViewport()
+        undo_state = cmds.undoInfo(q=True, state=True)
+        cmds.undoInfo(stateWithoutFlush=False)
+        
+        try:
+            self.__isolateSelectedInViewport()
+        finally:
+            cmds.undoInfo(stateWithoutFlush=undo_state)
+            
         self.__refreshShapesList()
         
     def __handleUIClosed(self, *args):
-        self.__isolateSelectedInViewport(0)
+        self.closed = True
         
         if cmds.panel(self.viewport, exists=True):
+            self.__isolateSelectedInViewport(0)
             cmds.deleteUI(self.viewport, pnl=True)   
         
-        cmds.lockNode(self.grp, l=False)
-        cmds.delete(self.grp)
+        undo_state = cmds.undoInfo(q=True, state=True)
+        cmds.undoInfo(stateWithoutFlush=False)
+        
+        try:
+            self.__deletePreviewRig()
+        finally:
+            cmds.undoInfo(stateWithoutFlush=undo_state)
+        
+        OpenMaya.MMessage.removeCallback(self.__uiCallback)
+        
+        for callback in self.__sceneCallbacks:
+            OpenMaya.MMessage.removeCallback(callback)
+        
+    def __deletePreviewRig(self):
+        if self.__grp_handle.isAlive():
+            grp = OpenMaya.MFnDagNode(self.__grp_handle.object()).fullPathName()
+            
+            cmds.lockNode(grp, l=False)
+            cmds.delete(grp)
         
         try:
             cmds.namespace(rm=self.ns)
         except:
             mel.eval('''warning "Could not cleanup namespace '%s' when closing window"''' % self.ns)
         
-        OpenMaya.MMessage.removeCallback(self.__uiCallback)
-        
     #-------------------------------------------------------- GETTR METHODS ---
     def __get_selectedShape(self):
         result = None
@@ -178,10 +342,18 @@ class CurveToolUI(object):
                 cmds.select(clear=True)
                 
     def __refreshShapesList(self):
+        selected_shape = self.__get_selectedShape()
+        shapes = get_shapes()
+        
         cmds.textScrollList(self.shapesList, edit=True, ra=True)
         
-        for shape in get_shapes():
-            cmds.textScrollList(self.shapesList, edit=True, a=shape)
+        if shapes:
+            cmds.textScrollList(self.shapesList, edit=True, a=shapes)
+            
+            if selected_shape in shapes:
+                cmds.textScrollList(self.shapesList, edit=True, si=selected_shape)
+            
+        self.__shapes_stamp = get_shapesStamp()
     
     #------------------------------------------------------- CLICK HANDLERS ---
     def __handleCreateClick(self, *args):
@@ -241,21 +413,42 @@ class CurveToolUI(object):
         else:
             mel.eval('''warning "Select a shape from the list and try again."''')
 
+    def __handleSyncMenu(self, *args):
+        updated = sync_library_from_scene()
+        
+        if self.__get_selectedShape() in updated:
+            self.__createPreviewShape()
+            
+        print "# Synced %s shape(s): %s" % (len(updated), ', '.join(updated))
+
     def __handleShapeListSelection(self, *args):
         self.__createPreviewShape()      
         
     def __createPreviewShape(self):
+        undo_state = cmds.undoInfo(q=True, state=True)
+        cmds.undoInfo(stateWithoutFlush=False)
+        
+        try:
+            self.__updatePreviewShape()
+        finally:
+            cmds.undoInfo(stateWithoutFlush=undo_state)
+        
+    def __updatePreviewShape(self):
         selected_shape = self.__get_selectedShape()
         
         if selected_shape:
             if self.preview_curve is None or not cmds.objExists(self.preview_curve):
                 self.preview_curve = createCurve(selected_shape, '%s:PREVIEW_CRV' % self.ns)
                 
-                cmds.parent(self.preview_curve, self.grp)
+                self.preview_curve = cmds.parent(self.preview_curve, 
+                                                 self.get_rigRoot())[0]
             else:
                 replaceCurve(selected_shape, [self.preview_curve])
+                
+            # flag the new preview nodes right away, not only on save
+            self.__setRigDoNotWrite()
         else:
-            if cmds.objExists(self.preview_curve):
+            if self.preview_curve is not None and cmds.objExists(self.preview_curve):
                 cmds.delete(self.preview_curve)
                 self.preview_curve = None
                 
@@ -279,6 +472,42 @@ def __get_shapesDir():
     
     return shapes_dir
 
+def __get_snapshotsDir():
+    '''
+    Return the path to the /curves/snapshots folder in the user prefs 
+    directory. Create the folder if it does not already exist.
+    '''
+    snapshots_dir = ''.join([__get_shapesDir(), 'snapshots/'])
+    
+    if not os.path.isdir(snapshots_dir):
+        os.makedirs(snapshots_dir)
+        
+    return snapshots_dir
+
+def __get_snapshotFile(snapshot, new_file=False):
+    '''
+    Return the path of 'snapshot', which is either a path to a snapshot file or
+    the name of a snapshot in the snapshots folder.
+    '''
+    result = None
+    
+    if os.path.isfile(snapshot):
+        return snapshot
+    
+    snapshot_file = ''.join([__get_snapshotsDir(), snapshot, SNAPSHOT_FILE_EXT])
+    
+    if not new_file:
+        try:
+            __validate_shapeFile(snapshot_file)
+            result = snapshot_file
+        except IOError:
+            msg = "Snapshot '%s' does not exist." % snapshot
+            mel.eval('''warning "%s"''' % msg)
+    else:
+        result = snapshot_file
+        
+    return result
+
 def __get_shapeName(file_):
     if not file.endswith(CURVE_FILE_EXT):
         raise Exception('%s is not a curve file.' % file_)
@@ -290,17 +519,42 @@ def __get_shapeName(file_):
     
     return result
 
+def get_shapesStamp():
+    '''
+    Return the modification time of the shapes folder. It changes whenever a
+    shape file is added, renamed or removed.
+    '''
+    return os.path.getmtime(__get_shapesDir())
+
 def get_shapes():
-    result = []
-    
+    '''
+    Return the names of the shapes in the shapes folder. The listing is cached
+    until the folder changes on disk.
+    '''
     shapes_dir = __get_shapesDir()
+    stamp = get_shapesStamp()
+    
+    cached = SHAPES_CACHE.get(shapes_dir)
+    
+    if cached is not None and cached[0] == stamp:
+        return list(cached[1])
     
-    for file_ in os.listdir(shapes_dir):
+    result = []
+    
+    for file_ in sorted(os.listdir(shapes_dir)):
         filepath = ''.join([shapes_dir, file_])
         if os.path.isfile(filepath) and file_.endswith(CURVE_FILE_EXT):
             result.append(file_.replace(CURVE_FILE_EXT, ""))
+    
+    SHAPES_CACHE[shapes_dir] = (stamp, result)
             
-    return result
+    return list(result)
+
+def clear_shapesCache():
+    '''Drop the cached shapes listing and the cached shape files.'''
+    SHAPES_CACHE.clear()
+    MEL_CMDS_CACHE.clear()
+    FINGERPRINTS_CACHE.clear()
 
 def __get_shapeFile(shape, new_file=False):
     result = None
@@ -319,6 +573,58 @@ def __get_shapeFile(shape, new_file=False):
         
     return result
 
+def __get_shapeFingerprint(shape_file):
+    '''
+    Return the fingerprint of the curves stored in 'shape_file', or None if the
+    file cannot be parsed. The fingerprint is cached until the file changes.
+    '''
+    stamp = os.path.getmtime(shape_file)
+    cached = FINGERPRINTS_CACHE.get(shape_file)
+    
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    
+    result = None
+    curves_data = []
+    
+    for mel_cmd in __getMELCmds(shape_file):
+        if not mel_cmd.strip():
+            continue
+        
+        crv_data = curve_utils.parseCurve(mel_cmd)
+        
+        if crv_data is None:
+            curves_data = None
+            break
+        
+        curves_data.append(crv_data)
+        
+    if curves_data:
+        result = curve_utils.fingerprintCurves(curves_data)
+        
+    FINGERPRINTS_CACHE[shape_file] = (stamp, result)
+    
+    return result
+
+def __get_controlCurves(obj):
+    '''Return the non-intermediate nurbsCurve shapes of 'obj'.'''
+    shapes = cmds.listRelatives(obj, shapes=True, type='nurbsCurve', 
+                                fullPath=True)
+    
+    return cmds.ls(shapes or [], ni=True, long=True)
+
+def __get_previewRoot():
+    '''
+    Return the full path of the preview rig of the open Curve Tools UI, or None
+    if there is none.
+    '''
+    result = None
+    
+    if CURVE_TOOL_UI is not None:
+        result = CURVE_TOOL_UI.get_rigRoot()
+        
+    return result
+
 def __get_selectedNurbsCurves():
     result = None
     
@@ -360,6 +666,45 @@ def __validate_shapeFile(shape_file):
     if not os.path.isfile(shape_file):
         raise IOError("File does not exist %s" % shape_file)
     
+def __parse_snapshot(data):
+    '''
+    Return the controls of 'data' as an OrderedDict of 
+    {transform path: (uuid, [list] of curve data)}, or None if 'data' is not a
+    snapshot of the current SNAPSHOT_VERSION or any curve fails to parse.
+    '''
+    if not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION:
+        return None
+    
+    controls = data.get('controls')
+    
+    if not isinstance(controls, dict):
+        return None
+    
+    result = OrderedDict()
+    
+    for path, control in controls.items():
+        if not isinstance(control, dict) or \
+           not isinstance(control.get('curves'), list):
+            return None
+        
+        curves_data = []
+        
+        for mel_cmd in control['curves']:
+            if not isinstance(mel_cmd, basestring):
+                return None
+            
+            # only the parsed values are used, the stored MEL is never run
+            crv_data = curve_utils.parseCurve(mel_cmd)
+            
+            if crv_data is None:
+                return None
+            
+            curves_data.append(crv_data)
+            
+        result[path] = (control.get('uuid'), curves_data)
+        
+    return result
+    
 def __confirmAction(title, msg):
     result = False
     
@@ -398,13 +743,79 @@ def __promptUserInput(title, msg, defaultText=""):
                 
     return result
 
+def __tagShape(obj, shape):
+    '''
+    Record on 'obj' the shape its nurbsCurves were built from, or clear the 
+    record if shape is None.
+    '''
+    exists = cmds.attributeQuery(SHAPE_ATTR, node=obj, exists=True)
+    
+    # tagging is optional, a locked or referenced node must not stop the 
+    # create/replace/append that called it
+    try:
+        if shape is None:
+            if exists:
+                cmds.deleteAttr(obj, at=SHAPE_ATTR)
+        else:
+            if not exists:
+                cmds.addAttr(obj, ln=SHAPE_ATTR, dt='string')
+                
+            cmds.setAttr('%s.%s' % (obj, SHAPE_ATTR), shape, type='string')
+    except RuntimeError:
+        traceback.print_exc()
+        msg = "Could not tag '%s' with its shape. " % obj +\
+              "See script editor for details."
+        mel.eval('''warning "%s"''' % msg)
+
+def __captureCurves(nurbs_curves):
+    '''
+    Return the curve data of 'nurbs_curves' and its fingerprint.
+    '''
+    curves_data = [curve_utils.getCurveData(crv) for crv in nurbs_curves]
+    
+    return curves_data, curve_utils.fingerprintCurves(curves_data)
+
+def __writeShapeFile(shape_file, curves_data, fingerprint):
+    '''
+    Save 'curves_data' over 'shape_file'. Return True if the file was written 
+    and None if an error occurred.
+    '''
+    result = None
+    
+    # written at full precision, so the file parses back to 'fingerprint'
+    mel_cmds = [curve_utils.formatCurve(crv_data) for crv_data in curves_data]
+    
+    try:
+        with open(shape_file, 'w') as f:
+            for cmd in mel_cmds:
+                f.write(cmd + "\n")
+        
+        MEL_CMDS_CACHE.pop(shape_file, None)
+        FINGERPRINTS_CACHE[shape_file] = (os.path.getmtime(shape_file), 
+                                          fingerprint)
+        result = True
+    except IOError:
+        msg = "Encountered an error trying to write " +\
+              "file '%s'. See script editor for details." % shape_file
+        mel.eval('''warning "%s"''' % msg)
+        
+    return result
+
 def __getMELCmds(shape_file):
     result = []
     
     try:
+        stamp = os.path.getmtime(shape_file)
+        cached = MEL_CMDS_CACHE.get(shape_file)
+        
+        if cached is not None and cached[0] == stamp:
+            return list(cached[1])
+        
         with open(shape_file, 'r') as f:
             result = f.readlines()
-    except IOError:
+            
+        MEL_CMDS_CACHE[shape_file] = (stamp, list(result))
+    except (IOError, OSError):
         msg = "An error occurred reading file '%s'." % shape_file +\
              "See script editor for details." 
         mel.eval('''warning "%s"''' % msg)
@@ -453,6 +864,7 @@ def createCurve(shape, name=None):
             mel_cmds = __getMELCmds(shape_file)
             result = cmds.createNode('transform', name=name)
             __createCurves(result, mel_cmds, shape)
+            __tagShape(result, shape)
         
     if result is not None:
         cmds.select(result)
@@ -475,6 +887,8 @@ def appendCurve(shape, objects=None):
         if objects:
             for obj in objects:
                 __createCurves(obj, mel_cmds, shape)
+                # the curves no longer match a single shape
+                __tagShape(obj, None)
         else:
             mel.eval('''warning "Select at least one object and try again."''')
 
@@ -514,6 +928,7 @@ def replaceCurve(shape, objects=None):
                         
                 cmds.delete(nurbs_curves)
                 __createCurves(obj, mel_cmds, shape)
+                __tagShape(obj, shape)
         else:
             mel.eval('''warning "Select at least one object with nurbsCurve shape nodes and try again."''')
             
@@ -538,19 +953,14 @@ def saveCurve(nurbs_curves=None, name=None):
                 
                 if name is not None:
                     shape_file = __get_shapeFile(name, new_file=True)
-                    mel_cmds = curve_utils.serializeCurves(nurbs_curves)
                     
-                    try:
-                        with open(shape_file, 'w') as f:
-                            for cmd in mel_cmds:
-                                f.write(cmd + "\n")
-                            
+                    # same lossless format as overwriteCurve, so the saved
+                    # shape fingerprints the same as the curves it came from
+                    curves_data, fingerprint = __captureCurves(nurbs_curves)
+                    
+                    if __writeShapeFile(shape_file, curves_data, fingerprint):
                         result = shape_file
-                    except IOError:
-                        msg = "Encountered an error trying to save " +\
-                              "shape '%s' to file '%s'" % (name, shape_file) +\
-                              "See script editor for details."
-                        mel.eval('''warning "%s."''' % msg)
+                        SHAPES_CACHE.clear()
     else:
         mel.eval('warning "Select a nurbsCurve and try again."')
                 
@@ -560,7 +970,7 @@ def overwriteCurve(shape, nurbs_curves=None):
     '''
     Serializes 'nurbs_curves' to MEL cmds, save them over the selected shape and
     return the file path. If the user cancels the save or an error occurs,
-    return None. 
+    return None. The file is left untouched if it already holds the same shape.
     '''
     result = None
     
@@ -572,18 +982,12 @@ def overwriteCurve(shape, nurbs_curves=None):
         
         if shape_file is not None:
             if __validate_nurbsCurves(nurbs_curves):
-                mel_cmds = curve_utils.serializeCurves(nurbs_curves)
+                curves_data, fingerprint = __captureCurves(nurbs_curves)
                 
-                try:
-                    with open(shape_file, 'w') as f:
-                        for cmd in mel_cmds:
-                            f.write(cmd + "\n")
-                    
+                if fingerprint == __get_shapeFingerprint(shape_file):
+                    result = shape_file
+                elif __writeShapeFile(shape_file, curves_data, fingerprint):
                     result = shape_file
-                except IOError:
-                    msg = "Encountered an error trying to overwrite " +\
-                          "file '%s'. See script editor for details." % shape_file
-                    mel.eval('''warning "%s"''' % msg)
     else:
         mel.eval('warning "Select a nurbsCurve and try again."')
   
@@ -601,6 +1005,7 @@ def deleteCurve(shape):
             
             try:
                 os.remove(shape_file)
+                clear_shapesCache()
                 result = True
             except Exception:
                 traceback.print_exc()
@@ -610,6 +1015,303 @@ def deleteCurve(shape):
             
     return result
 
-def main():
+def sync_library_from_scene(objects=None):
+    '''
+    Overwrite the library shapes with the nurbsCurves of the controls built 
+    from them and return the names of the shapes that were rewritten. Shapes
+    whose curves did not change are skipped without being serialized.
+    
+    Controls are every object tagged by createCurve/replaceCurve (or 'objects'
+    if given). An untagged object in 'objects' is matched to the library shape
+    with the same name. A shape whose controls hold different curves is
+    skipped with a warning. The user is asked to confirm before any file is
+    overwritten.
+    '''
+    result = []
+    
+    if objects is None:
+        objects = cmds.ls('*.%s' % SHAPE_ATTR, 
+                          objectsOnly=True, 
+                          long=True, 
+                          recursive=True)
+    
+    library = set(get_shapes())
+    preview_root = __get_previewRoot()
+    
+    #---------------------------------------------- group controls by shape ---
+    # {shape: {fingerprint: ([list] of controls, curves data)}}
+    candidates = OrderedDict()
+    
+    for obj in cmds.ls(objects or [], long=True):
+        if preview_root is not None and obj.startswith(preview_root + '|'):
+            continue
+        
+        if cmds.attributeQuery(SHAPE_ATTR, node=obj, exists=True):
+            shape = cmds.getAttr('%s.%s' % (obj, SHAPE_ATTR))
+        else:
+            shape = obj.rsplit('|', 1)[-1].rsplit(':', 1)[-1]
+            
+        if shape not in library:
+            continue
+        
+        nurbs_curves = __get_controlCurves(obj)
+        
+        if nurbs_curves:
+            curves_data, fingerprint = __captureCurves(nurbs_curves)
+            
+            variants = candidates.setdefault(shape, OrderedDict())
+            variants.setdefault(fingerprint, ([], curves_data))[0].append(obj)
+    
+    #------------------------------------------------- find modified shapes ---
+    modified = OrderedDict()
+    conflicts = []
+    
+    for shape, variants in candidates.items():
+        if len(variants) > 1:
+            conflicts.append(shape)
+            print "# Controls of shape '%s' differ:" % shape
+            
+            for controls, curves_data in variants.values():
+                print "#     %s" % ', '.join(controls)
+                
+            continue
+        
+        shape_file = __get_shapeFile(shape)
+        
+        if shape_file is None:
+            continue
+        
+        fingerprint, (controls, curves_data) = variants.items()[0]
+        
+        if fingerprint != __get_shapeFingerprint(shape_file):
+            modified[shape] = (shape_file, curves_data, fingerprint, controls)
+            
+    if conflicts:
+        msg = "Skipped %s shape(s) whose controls differ: " % len(conflicts) +\
+              "%s. See script editor for details." % ', '.join(conflicts)
+        mel.eval('''warning "%s"''' % msg)
+        
+    if not modified:
+        return result
+    
+    #----------------------------------------------------- overwrite shapes ---
+    details = []
+    
+    for shape, (shape_file, curves_data, fingerprint, controls) in modified.items():
+        details.append("%s  <-  %s" % (shape, ', '.join(controls)))
+        
+    if not __confirmAction("Sync Library", 
+                           "Overwrite these shapes from the scene?\n\n" +\
+                           '\n'.join(details)):
+        return result
+    
+    for shape, (shape_file, curves_data, fingerprint, controls) in modified.items():
+        if __writeShapeFile(shape_file, curves_data, fingerprint):
+            result.append(shape)
+                    
+    return result
+
+def export_scene_controls(root=None, snapshot_file=None):
+    '''
+    Serialize the nurbsCurves of every transform below 'root' (or in the whole
+    scene if root is None) into a single snapshot file and return its path. If
+    snapshot_file is None, the user will be prompted for a snapshot name. If 
+    the user cancels or an error occurs, return None.
+    '''
+    result = None
+    
+    if root is not None and not cmds.objExists(root):
+        mel.eval('''warning "Object '%s' does not exist."''' % root)
+        return result
+    
+    if snapshot_file is None:
+        name = __promptUserInput("Export Controls",
+                                 "Enter a name for the snapshot file")
+        
+        if name is None:
+            return result
+        
+        snapshot_file = __get_snapshotFile(name, new_file=True)
+    
+    controls = curve_utils.getSceneCurves(root)
+    
+    # never export the preview curve of an open Curve Tools UI
+    preview_root = __get_previewRoot()
+    
+    if preview_root is not None:
+        for xform in controls.keys():
+            if xform.startswith(preview_root + '|'):
+                del controls[xform]
+    
+    if not controls:
+        mel.eval('''warning "No nurbsCurves found to export."''')
+        return result
+    
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'root': root,
+        'controls': controls
+    }
+    
+    try:
+        with gzip.open(snapshot_file, 'wb') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+            
+        result = snapshot_file
+    except IOError:
+        traceback.print_exc()
+        msg = "Encountered an error trying to export controls to " +\
+              "file '%s'. See script editor for details." % snapshot_file
+        mel.eval('''warning "%s"''' % msg)
+        
+    return result
+
+def import_scene_controls(snapshot):
+    '''
+    Replace the nurbsCurve shapes of every control stored in 'snapshot' (a 
+    snapshot file path or name) and return the list of updated transforms. 
+    Controls are matched by full path, then UUID, then unique short name. 
+    Locked or referenced controls are skipped. All shapes are rebuilt in a 
+    single MDagModifier, so the import either fully succeeds or leaves the 
+    scene untouched. The import is not added to the undo queue.
+    '''
+    result = []
+    
+    snapshot_file = __get_snapshotFile(snapshot)
+    
+    if snapshot_file is None:
+        return result
+    
+    try:
+        with gzip.open(snapshot_file, 'rb') as f:
+            data = json.load(f, object_pairs_hook=OrderedDict)
+    except (IOError, ValueError):
+        traceback.print_exc()
+        msg = "An error occurred reading snapshot '%s'. " % snapshot_file +\
+              "See script editor for details."
+        mel.eval('''warning "%s"''' % msg)
+        return result
+    
+    controls = __parse_snapshot(data)
+    
+    if controls is None:
+        msg = "'%s' is not a valid snapshot file " % snapshot_file +\
+              "(expected version %s)." % SNAPSHOT_VERSION
+        mel.eval('''warning "%s"''' % msg)
+        return result
+    
+    #------------------------------------------------------- match controls ---
+    by_path = set()
+    by_uuid = {}
+    by_name = {}
+    
+    for path, uuid in curve_utils.getSceneTransforms():
+        by_path.add(path)
+        
+        if uuid is not None:
+            by_uuid[uuid] = path
+            
+        by_name.setdefault(path.rsplit('|', 1)[-1], []).append(path)
+    
+    # {scene transform: (snapshot path, [list] of curve data)}
+    targets = OrderedDict()
+    missing = []
+    conflicts = []
+    
+    for path, (uuid, curves_data) in controls.items():
+        target = None
+        
+        if path in by_path:
+            target = path
+        elif uuid in by_uuid:
+            target = by_uuid[uuid]
+        else:
+            matches = by_name.get(path.rsplit('|', 1)[-1], [])
+            
+            if len(matches) == 1:
+                target = matches[0]
+                
+        if target is None:
+            missing.append(path)
+        elif target in targets:
+            conflicts.append('%s -> %s (already claimed by %s)' % 
+                             (path, target, targets[target][0]))
+        else:
+            targets[target] = (path, curves_data)
+    
+    #------------------------------------------------- skip locked controls ---
+    # {scene transform: [list] of nurbsCurves to replace}
+    old_curves = OrderedDict()
+    locked = []
+    
+    for xform in targets.keys():
+        curves = __get_controlCurves(xform)
+        nodes = [xform] + curves
+        
+        if any(cmds.lockNode(nodes, q=True, l=True)) or \
+           any(cmds.referenceQuery(n, isNodeReferenced=True) for n in curves):
+            locked.append(xform)
+            del targets[xform]
+        else:
+            old_curves[xform] = curves
+            
+    for label, paths in (("were not found in the scene", missing),
+                         ("resolve to an already matched control", conflicts),
+                         ("are locked or referenced", locked)):
+        if paths:
+            msg = "%s control(s) from the snapshot %s. " % (len(paths), label) +\
+                  "See script editor for details."
+            print "# Controls that %s: %s" % (label, ', '.join(paths))
+            mel.eval('''warning "%s"''' % msg)
+        
+    if not targets:
+        return result
+    
+    #------------------------------------------------------- rebuild curves ---
+    dag_mod = OpenMaya.MDagModifier()
+    
+    try:
+        for xform, (path, curves_data) in targets.items():
+            for crv in old_curves[xform]:
+                dag_mod.deleteNode(curve_utils.getMObject(crv))
+            
+            xform_obj = curve_utils.getMObject(xform)
+            name = xform.rsplit('|', 1)[-1]
+            
+            for i, crv_data in enumerate(curves_data, 1):
+                crv_obj = dag_mod.createNode('nurbsCurve', xform_obj)
+                dag_mod.renameNode(crv_obj, '%sShape%s' % (name, i))
+                
+                plug = OpenMaya.MFnDependencyNode(crv_obj).findPlug('cached')
+                dag_mod.newPlugValue(plug, 
+                                     curve_utils.createCurveData(crv_data))
+                
+        dag_mod.doIt()
+        result = list(targets.keys())
+    except:
+        traceback.print_exc()
+        dag_mod.undoIt()
+        msg = "An error occurred importing snapshot '%s'. " % snapshot_file +\
+              "No controls were changed. See script editor for details."
+        mel.eval('''warning "%s"''' % msg)
+        
+    return result
+
+def main(session=True):
+    '''
+    Open the Curve Tools UI. In session mode an existing session is restored
+    instead of rebuilding the window and the preview rig.
+    '''
+    global CURVE_TOOL_UI
+    
+    if CURVE_TOOL_UI is not None:
+        if session and CURVE_TOOL_UI.session and CURVE_TOOL_UI.show():
+            return CURVE_TOOL_UI
+        
+        CURVE_TOOL_UI.close()
+        CURVE_TOOL_UI = None
+    
     reload(curve_utils)
-    CURVE_TOOL_UI = CurveToolUI()
\ No newline at end of file
+    CURVE_TOOL_UI = CurveToolUI(session=session)
+    
+    return CURVE_TOOL_UI
\ No newline at end of file
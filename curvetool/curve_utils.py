@@ -10,9 +10,13 @@
 
 #------------------------------------------------------------------ IMPORTS ---
 # Built-in
+import hashlib
 import os.path
+from collections import OrderedDict
 
 # Third Part
+import maya.OpenMaya as OpenMaya
+
 import maya.cmds as cmds
 import maya.mel as mel
 
@@ -92,4 +96,277 @@ def serializeCurve(crv):
         for c in cv:
             cmd.append(str(c)) 
     
-    return ' '.join(cmd)
\ No newline at end of file
+    return ' '.join(cmd)
+
+def serializeCurvePath(dag_path):
+    '''
+    API equivalent of serializeCurve. Reads the curve data through 
+    MFnNurbsCurve instead of a temporary curveInfo node and per-CV xform 
+    queries, so it is safe to call on thousands of curves.
+    
+    ARGUMENTS:
+        dag_path - [MDagPath] path to a nurbsCurve shape
+        
+    RETURNS: [str] a MEL command
+    '''
+    
+    return formatCurve(getCurveData(dag_path))
+
+def formatCurve(curve_data):
+    '''
+    Return the MEL setAttr command for 'curve_data'. Values are written at full
+    precision, so parseCurve gives back the same data.
+    
+    ARGUMENTS:
+        curve_data - [tuple] as returned by getCurveData or parseCurve
+        
+    RETURNS: [str] a MEL command
+    '''
+    degree, spans, form, knots, cvs = curve_data
+    
+    cmd = []
+    
+    cmd.append('setAttr "%s.cc" -type "nurbsCurve"')
+    cmd.append('%s %s %s no 3' % (degree, spans, form))
+    cmd.append('%s' % len(knots))
+    
+    for k in knots:
+        cmd.append(repr(k))
+        
+    cmd.append('%s' % len(cvs))
+    
+    for cv in cvs:
+        for c in cv:
+            cmd.append(repr(c))
+    
+    return ' '.join(cmd)
+
+def getCurveData(crv):
+    '''
+    Return the data that defines the shape of 'crv', read through 
+    MFnNurbsCurve.
+    
+    ARGUMENTS:
+        crv - [str] a nurbsCurve Maya object or [MDagPath] a path to one
+        
+    RETURNS: [tuple] (degree, spans, form, [list] of knots, [list] of (x, y, z)
+             object space CVs)
+    '''
+    
+    if isinstance(crv, OpenMaya.MDagPath):
+        dag_path = crv
+    else:
+        sel = OpenMaya.MSelectionList()
+        sel.add(crv)
+        dag_path = OpenMaya.MDagPath()
+        sel.getDagPath(0, dag_path)
+    
+    if not dag_path.hasFn(OpenMaya.MFn.kNurbsCurve):
+        raise TypeError("crv must be a nurbsCurve object")
+    
+    fn = OpenMaya.MFnNurbsCurve(dag_path)
+    
+    knots = OpenMaya.MDoubleArray()
+    fn.getKnots(knots)
+    
+    cvs = OpenMaya.MPointArray()
+    fn.getCVs(cvs, OpenMaya.MSpace.kObject)
+    
+    # MFnNurbsCurve forms are 1-based, the nurbsCurve attribute is 0-based
+    return (
+        fn.degree(), 
+        fn.numSpans(), 
+        fn.form() - 1,
+        [knots[i] for i in range(knots.length())],
+        [(cvs[i].x, cvs[i].y, cvs[i].z) for i in range(cvs.length())]
+    )
+
+def parseCurve(mel_cmd):
+    '''
+    Return the curve data stored in a MEL command created by serializeCurve or
+    serializeCurvePath, in the same layout as getCurveData. Return None if the
+    command cannot be parsed.
+    
+    ARGUMENTS:
+        mel_cmd - [str] a MEL command
+        
+    RETURNS: [tuple] (degree, spans, form, [list] of knots, [list] of (x, y, z)
+             object space CVs) or None
+    '''
+    tokens = mel_cmd.replace(';', ' ').split()
+    
+    try:
+        i = tokens.index('"nurbsCurve"') + 1
+        
+        degree, spans, form = [int(t) for t in tokens[i:i + 3]]
+        i += 5
+        
+        num_knots = int(tokens[i])
+        knots = [float(t) for t in tokens[i + 1:i + 1 + num_knots]]
+        i += 1 + num_knots
+        
+        num_cvs = int(tokens[i])
+        values = [float(t) for t in tokens[i + 1:i + 1 + num_cvs * 3]]
+        cvs = [tuple(values[j:j + 3]) for j in range(0, len(values), 3)]
+    except (ValueError, IndexError):
+        return None
+    
+    if len(knots) != num_knots or len(cvs) != num_cvs:
+        return None
+    
+    return (degree, spans, form, knots, cvs)
+
+def fingerprintCurves(curves_data, precision=5):
+    '''
+    Return a hash of the shape defined by 'curves_data'. Values are rounded to
+    'precision' decimals so that data read from the scene and data parsed back
+    from a shape file give the same fingerprint.
+    
+    ARGUMENTS:
+        curves_data - [list] of curve data tuples, as returned by getCurveData
+                      or parseCurve
+        precision   - [int] number of decimals to compare
+        
+    RETURNS: [str] a hex digest
+    '''
+    
+    def normalize(value):
+        # adding 0.0 turns -0.0 into 0.0
+        return round(value, precision) + 0.0
+    
+    md5 = hashlib.md5()
+    
+    for degree, spans, form, knots, cvs in curves_data:
+        md5.update(repr((
+            degree, 
+            spans, 
+            form, 
+            [normalize(k) for k in knots],
+            [tuple(normalize(c) for c in cv) for cv in cvs]
+        )))
+        
+    return md5.hexdigest()
+
+def getSceneCurves(root=None):
+    '''
+    Return the serialized nurbsCurves of every transform below 'root' (or in 
+    the whole scene if root is None), gathered with a single MItDag pass.
+    
+    ARGUMENTS:
+        root - [str] name of the DAG node to start from
+    
+    RETURNS: [OrderedDict] {transform full path: {'uuid': [str] or None,
+                                                  'curves': [list] of MEL 
+                                                  commands}}
+    '''
+    result = OrderedDict()
+    
+    dag_it = OpenMaya.MItDag(OpenMaya.MItDag.kDepthFirst, 
+                             OpenMaya.MFn.kNurbsCurve)
+    
+    if root is not None:
+        sel = OpenMaya.MSelectionList()
+        sel.add(root)
+        root_obj = OpenMaya.MObject()
+        sel.getDependNode(0, root_obj)
+        
+        dag_it.reset(root_obj, 
+                     OpenMaya.MItDag.kDepthFirst, 
+                     OpenMaya.MFn.kNurbsCurve)
+    
+    while not dag_it.isDone():
+        crv_path = OpenMaya.MDagPath()
+        dag_it.getPath(crv_path)
+        
+        if not OpenMaya.MFnDagNode(crv_path).isIntermediateObject():
+            cmd = serializeCurvePath(crv_path)
+            
+            crv_path.pop()
+            xform = crv_path.fullPathName()
+            
+            if xform not in result:
+                result[xform] = {
+                    'uuid': getUuid(crv_path.node()),
+                    'curves': []
+                }
+            
+            result[xform]['curves'].append(cmd)
+            
+        dag_it.next()
+        
+    return result
+
+def getSceneTransforms():
+    '''
+    Return the full path and UUID of every transform in the scene, gathered 
+    with a single MItDag pass.
+    
+    RETURNS: [list] of (full path, uuid) tuples
+    '''
+    result = []
+    
+    dag_it = OpenMaya.MItDag(OpenMaya.MItDag.kDepthFirst, 
+                             OpenMaya.MFn.kTransform)
+    
+    while not dag_it.isDone():
+        xform_path = OpenMaya.MDagPath()
+        dag_it.getPath(xform_path)
+        
+        result.append((xform_path.fullPathName(), 
+                       getUuid(xform_path.node())))
+        
+        dag_it.next()
+        
+    return result
+
+def getUuid(node):
+    '''
+    Return the UUID of the MObject 'node' as a string, or None on Maya versions
+    without node UUIDs.
+    '''
+    try:
+        return OpenMaya.MFnDependencyNode(node).uuid().asString()
+    except AttributeError:
+        return None
+
+def getMObject(node):
+    '''
+    Return the MObject of the Maya object named 'node'.
+    '''
+    sel = OpenMaya.MSelectionList()
+    sel.add(node)
+    
+    result = OpenMaya.MObject()
+    sel.getDependNode(0, result)
+    
+    return result
+
+def createCurveData(curve_data):
+    '''
+    Return a nurbsCurve geometry data object holding 'curve_data', that can be
+    set on the 'cached' attribute of a nurbsCurve.
+    
+    ARGUMENTS:
+        curve_data - [tuple] as returned by getCurveData or parseCurve
+    
+    RETURNS: [MObject] a kNurbsCurveData object
+    '''
+    degree, spans, form, knots, cvs = curve_data
+    
+    knots_array = OpenMaya.MDoubleArray()
+    
+    for k in knots:
+        knots_array.append(k)
+    
+    cvs_array = OpenMaya.MPointArray()
+    
+    for cv in cvs:
+        cvs_array.append(OpenMaya.MPoint(*cv))
+    
+    result = OpenMaya.MFnNurbsCurveData().create()
+    
+    # MFnNurbsCurve forms are 1-based, the nurbsCurve attribute is 0-based
+    OpenMaya.MFnNurbsCurve().create(cvs_array, knots_array, degree, form + 1,
+                                    False, False, result)
+    
+    return result